@@ -1,26 +1,116 @@
+from gevent import monkey
+if not monkey.is_module_patched('socket'):  # RotorHazard's server normally patches before loading plugins
+    # Leave threading native: the scan reader needs a real OS thread for its blocking serial reads
+    monkey.patch_all(thread=False, subprocess=False)
+import os
 import json
 from datetime import datetime
-import math
-from rplidar import RPLidar
+import collections
+import numpy as np
 from eventmanager import Evt
 from RHUI import UIField, UIFieldType
 from Database import ProgramMethod
 import gevent
+import gevent.event
 import asyncio
-import threading
-from gevent import monkey; monkey.patch_all()
+from flask import Blueprint, Response, jsonify
+
+OPTION_CACHE_SIZE = 16
+OPTION_CACHE_TTL = 600.0  # Seconds before a cached option is re-read from the database
+DETECTION_DEBOUNCE_NS = 50_000_000  # Minimum nanoseconds between last_detection_time_ns updates
+SKIP_NOTIFY_INTERVAL = 10.0  # Minimum seconds between 'LIDAR not running' lap notifications
+SCAN_PUSH_INTERVAL = 0.05  # Minimum seconds between scans pushed to the visualization (20 Hz)
+VIZ_KEEPALIVE_TIMEOUT = 5.0  # Seconds without a keep-alive from an open /lidar page before pushing stops
+SCAN_THREAD_PRIORITY = 20  # SCHED_FIFO priority of the scan thread
+SCAN_FRAME_SIZE = 8192  # Points per revolution the scan frames hold before growing
+CALIBRATION_BUFFER_SIZE = 65536  # Maximum gate-area readings kept by one calibration run
+
+
+def _gate_slices(sorted_angles, low, high):
+    """Return (lo, hi) so that sorted_angles[:lo] < low and sorted_angles[hi:] > high."""
+    return (int(np.searchsorted(sorted_angles, low, side='left')),
+            int(np.searchsorted(sorted_angles, high, side='right')))
+
+
+# cos/sin of every 0.1 degree step, the LIDAR's angular resolution is coarser than this
+LUT_STEPS_PER_DEGREE = 10
+LUT_SIZE = 360 * LUT_STEPS_PER_DEGREE
+COS_LUT = np.cos(np.deg2rad(np.arange(LUT_SIZE) / LUT_STEPS_PER_DEGREE)).astype(np.float32)
+SIN_LUT = np.sin(np.deg2rad(np.arange(LUT_SIZE) / LUT_STEPS_PER_DEGREE)).astype(np.float32)
+
+
+def _project_scan_numpy(angles, distances, xs, ys):
+    """Convert distances from mm to cm in place and project the scan to x/y in cm."""
+    np.multiply(distances, 0.1, out=distances)
+    idx = (angles * LUT_STEPS_PER_DEGREE).astype(np.int32) % LUT_SIZE
+    np.multiply(distances, COS_LUT[idx], out=xs)
+    np.multiply(distances, SIN_LUT[idx], out=ys)
+
+
+def _project_scan_loop(angles, distances, xs, ys):
+    """Scalar version of _project_scan_numpy, fused into one pass when compiled by Numba."""
+    for i in range(angles.size):
+        idx = int(angles[i] * LUT_STEPS_PER_DEGREE) % LUT_SIZE
+        distance_cm = distances[i] * 0.1
+        distances[i] = distance_cm
+        xs[i] = distance_cm * COS_LUT[idx]
+        ys[i] = distance_cm * SIN_LUT[idx]
+
+
+# Projection kernel used by _publish_scan, set up by _build_project_scan on the first LIDAR start
+_project_scan = None
+
+
+def _build_project_scan():
+    """
+    Set up _project_scan, compiling it with Numba when available. Deferred to start_lidar so plugin
+    load never waits on importing Numba or on the compiler.
+    """
+    global _project_scan
+    if _project_scan is not None:
+        return
+    try:
+        from numba import njit
+    except ImportError:  # Numba is optional, the NumPy projection is used without it
+        _project_scan = _project_scan_numpy
+        return
+    # Compiled for the one layout it is ever called with: contiguous float32 frame rows
+    _project_scan = njit('void(float32[::1], float32[::1], float32[::1], float32[::1])',
+                         cache=True, fastmath=True, boundscheck=False)(_project_scan_loop)
+
 
 class LidarValidator:
     def __init__(self, rhapi):
         self.rhapi = rhapi
         self.lidar = None
         self.detection_threshold = None
-        self.last_detection_time = None
+        self.last_detection_time_ns = None  # Monotonic nanoseconds of the latest gate detection
         self.detection_window = 1.0  # Time window in seconds to match detections
+        self._window_ns = 1_000_000_000  # detection_window in nanoseconds, as compared per lap
         self.is_running = False
+        self._debug = False  # Post per-lap timing details to the UI
         self.scanning_greenlet = None
-        self.last_scan_data = []  # Initialize empty list for scan data
-        self.scan_lock = threading.Lock()  # Add a lock for thread-safe data access
+        self._scan_thread = None
+        # Completed revolutions handed from the scan thread to the hub (oldest dropped when full)
+        self._scan_queue = collections.deque(maxlen=4)
+        self._scan_ready = None
+        self._scan_watcher = None
+        self._last_push = 0.0
+        self._last_viz_keepalive = float('-inf')
+        self._last_skip_notify = float('-inf')
+        # Callables fed every published revolution as (angles, distances in mm), sorted by angle
+        self._scan_subscribers = []
+        # Gate distances collected from each revolution while calibrate() is running
+        self._calibration_buf = np.empty(CALIBRATION_BUFFER_SIZE, dtype=np.float32)
+        self._calibration_count = 0
+        # Small LRU cache of option values: name -> (value, time read)
+        self._opt_cache = collections.OrderedDict()
+        # Preallocated struct-of-arrays frame, rows (angle, distance, x, y), reused for every
+        # revolution. Only the bytes copied out of it are published, so a single frame is enough.
+        self._frame = np.empty((4, SCAN_FRAME_SIZE), dtype=np.float32)
+        # Latest scan as the browser gets it: the x row then the y row (cm), packed as raw float32
+        # values. Replaced by a new bytes object each revolution, so readers just take the reference.
+        self._scan_payload = b''
         
         # Register port option
         port_field = UIField('lidar_port', 'LIDAR Port', UIFieldType.TEXT, 
@@ -38,6 +128,8 @@ class LidarValidator:
         window_field = UIField('detection_window', 'Detection Window (seconds)', UIFieldType.TEXT,
                 value='1.0',
                 desc='Time window for matching LIDAR detection with lap crossing')
+        debug_field = UIField('lidar_debug', 'Debug Messages', UIFieldType.CHECKBOX,
+                desc='Show LIDAR timing details for every validated lap')
 
         # Register all options
         self.rhapi.fields.register_option(port_field, 'lidar_control')
@@ -45,6 +137,7 @@ class LidarValidator:
         self.rhapi.fields.register_option(timeout_field, 'lidar_control')
         self.rhapi.fields.register_option(distance_field, 'lidar_control')
         self.rhapi.fields.register_option(window_field, 'lidar_control')
+        self.rhapi.fields.register_option(debug_field, 'lidar_control')
 
         
         # Create UI panel
@@ -66,54 +159,46 @@ class LidarValidator:
         self.rhapi.events.on(Evt.RACE_START, self.on_race_start)
         self.rhapi.events.on(Evt.LAPS_SAVE, self.on_race_stop)
         self.rhapi.events.on(Evt.LAPS_DISCARD, self.on_race_stop)        
+        self.rhapi.events.on(Evt.OPTION_SET, self.on_option_set)
+
+        # Open visualization pages check in periodically; scans are only pushed while they do
+        self.rhapi.ui.socket_listen('lidar_viz_keepalive', self.on_viz_keepalive)
 
         # Register the visualization page and API endpoint
-        from flask import Blueprint, jsonify, render_template
-        import os
+        self.rhapi.ui.blueprint_add(_build_blueprint(self))
 
-        # Get the directory where this plugin file is located
-        plugin_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Create blueprint with absolute paths
-        bp = Blueprint(
-            'lidar_viz',
-            __name__,
-            template_folder=os.path.join(plugin_dir, 'templates'),
-            static_folder=os.path.join(plugin_dir, 'static'),
-            static_url_path='/static/lidar-viz' 
-        )
-        
-        @bp.route('/lidar')
-        def lidar_view():
-            """Serve the LIDAR visualization page."""
-            try:
-                self.rhapi.ui.message_notify('Lidar view endpoint accessed')
-                return render_template('lidar_viz.html')
-            except Exception as e:
-                self.rhapi.ui.message_alert(f'Error loading template: {str(e)}')
-                return f'Error: {str(e)}'
-            
-       
-        @bp.route('/lidar/data')
-        def lidar_data():
-            """Serve LIDAR scan data as JSON."""
-            if not self.is_running:
-                return jsonify({
-                    'error': 'LIDAR not running',
-                    'scan': [],
-                    'threshold': self.detection_threshold or 1000
-                })
-            
-            with self.scan_lock:  # Protect data access with lock
-                return jsonify({
-                    'scan': self.last_scan_data,
-                    'threshold': self.detection_threshold
-                })
-                
-        # Register the blueprint
-        self.rhapi.ui.blueprint_add(bp)
+    def _get_opt(self, name):
+        """Read an option through the LRU cache, going to the database when missing or expired."""
+        now = gevent.time.monotonic()
+        cached = self._opt_cache.get(name)
+        if cached is not None and now - cached[1] < OPTION_CACHE_TTL:
+            self._opt_cache.move_to_end(name)
+            return cached[0]
+
+        value = self.rhapi.db.option(name)
+        self._opt_cache[name] = (value, now)
+        self._opt_cache.move_to_end(name)
+        if len(self._opt_cache) > OPTION_CACHE_SIZE:
+            self._opt_cache.popitem(last=False)  # Evict least recently used
+        return value
+
+    def _set_opt(self, name, value):
+        """Write an option to the database and drop its cached value."""
+        self.rhapi.db.option_set(name, value)
+        self._opt_cache.pop(name, None)
+
+    def on_viz_keepalive(self, data=None):
+        """Socket handler for the keep-alive sent by open visualization pages."""
+        self._last_viz_keepalive = gevent.time.monotonic()
+
+    def on_option_set(self, args):
+        """Handler for option changes made elsewhere (e.g. the settings panel)."""
+        option = args.get('option')
+        self._opt_cache.pop(option, None)
+        # Debug messages apply straight away, the other options are picked up by start_lidar
+        if option == 'lidar_debug':
+            self._debug = self._get_opt('lidar_debug') == '1'
 
-            
     def start_lidar(self, args=None):
         """Start the LIDAR scanning process with improved error handling."""
         if self.is_running:
@@ -122,31 +207,34 @@ class LidarValidator:
             
         try:
             # Get configuration from database
-            port = self.rhapi.db.option('lidar_port')
-            baudrate = int(self.rhapi.db.option('lidar_baudrate'))
-            timeout = int(self.rhapi.db.option('lidar_timeout'))
-            self.detection_threshold = int(self.rhapi.db.option('detection_distance'))
+            port = self._get_opt('lidar_port')
+            baudrate = int(self._get_opt('lidar_baudrate'))
+            timeout = int(self._get_opt('lidar_timeout'))
+            self.detection_threshold = int(self._get_opt('detection_distance'))
             
             # Get detection window from options (or use default if not found)
             try:
-                window_str = self.rhapi.db.option('detection_window')
+                window_str = self._get_opt('detection_window')
                 self.detection_window = float(window_str)
             except (ValueError, TypeError):
                 # Fall back to default if conversion fails
                 self.detection_window = 1.0
+            self._window_ns = int(self.detection_window * 1e9)
+            self._debug = self._get_opt('lidar_debug') == '1'
                 
             # Initialize LIDAR with error handling
             self.rhapi.ui.message_notify(f'LIDAR connecting to {port} at {baudrate} baud...')
             
             try:
                 # Check if port exists before connecting
-                import os
                 if not os.path.exists(port):
                     self.rhapi.ui.message_alert(f'LIDAR port {port} does not exist')
                     return
                     
-                # Connect to LIDAR with explicit timeout
+                # Connect to LIDAR with explicit timeout (rplidar/pyserial are only loaded when needed)
+                from rplidar import RPLidar
                 self.lidar = RPLidar(port, baudrate=baudrate, timeout=timeout)
+                self._enable_low_latency()
                 
                 # Test LIDAR with info request
                 info = self.lidar.get_info()
@@ -162,12 +250,23 @@ class LidarValidator:
                 self.lidar = None
                 return
                 
+            # Compile the projection kernel now rather than on the first revolution
+            _build_project_scan()
+
             # Mark as running before starting greenlet
             self.is_running = True
             
-            # Start scanning in a separate greenlet
+            # Serial reads and measurement parsing run on a native thread so they never stall the hub;
+            # a greenlet publishes the revolutions it hands over
             self.rhapi.ui.message_notify('LIDAR starting scan loop...')
-            self.scanning_greenlet = gevent.spawn(self.scan_loop)
+            hub = gevent.get_hub()
+            self._scan_queue.clear()
+            self._scan_payload = b''  # Don't serve the previous session's last sweep
+            self._scan_ready = gevent.event.Event()
+            self._scan_watcher = hub.loop.async_()
+            self._scan_watcher.start(self._scan_ready.set)
+            self._scan_thread = hub.threadpool.spawn(self.scan_loop)
+            self.scanning_greenlet = gevent.spawn(self._consume_scans)
             
             self.rhapi.ui.message_notify(f'LIDAR scanning started (detection window: {self.detection_window}s)')
             
@@ -181,87 +280,270 @@ class LidarValidator:
                 self.lidar = None
                 
             self.rhapi.ui.message_alert(f'Failed to start LIDAR: {str(e)}')            
+
+    def _enable_low_latency(self):
+        """
+        Set ASYNC_LOW_LATENCY on the LIDAR serial port (same as `setserial <port> low_latency`).
+        This drops the USB-serial adapter's 16ms latency timer to 1ms. Linux only; skipped elsewhere.
+        """
+        try:
+            import array
+            import fcntl
+
+            TIOCGSERIAL = 0x541E
+            TIOCSSERIAL = 0x541F
+            ASYNC_LOW_LATENCY = 0x2000
+
+            # rplidar releases name the underlying pyserial object differently
+            serial_port = getattr(self.lidar, '_serial_port', None) or getattr(self.lidar, '_serial', None)
+            fd = serial_port.fileno()
+
+            # struct serial_struct - 'flags' is the fifth int field
+            buf = array.array('i', [0] * 32)
+            fcntl.ioctl(fd, TIOCGSERIAL, buf, True)
+            buf[4] |= ASYNC_LOW_LATENCY
+            fcntl.ioctl(fd, TIOCSSERIAL, buf)
+        except Exception as e:
+            self.rhapi.ui.message_notify(f'LIDAR: low latency serial mode not enabled: {str(e)}')
+
     def stop_lidar(self, args=None):
         """Stop the LIDAR scanning process."""
         self.is_running = False
         if self.scanning_greenlet:
             self.scanning_greenlet.kill()
             self.scanning_greenlet = None
-            
-        if self.lidar:
-            self.lidar.stop()
-            self.lidar.disconnect()
-            self.lidar = None
+        self._join_scan_thread()
+        self._release_lidar()
             
         self.rhapi.ui.message_notify('LIDAR scanning stopped')
         
+    def _join_scan_thread(self):
+        """Wait for the scan thread to let go of the serial port, then drop the hub wakeup."""
+        if self._scan_thread:
+            # wait() doesn't raise: a thread stuck in a serial read (no data for up to lidar_timeout)
+            # is left to fail once _release_lidar closes the port under it
+            self._scan_thread.wait(2.0)
+            if not self._scan_thread.ready():
+                self.rhapi.ui.message_notify("LIDAR: Scan thread did not stop in time, closing the port")
+            self._scan_thread = None
+
+        watcher = self._scan_watcher
+        self._scan_watcher = None
+        if watcher:
+            watcher.stop()
+            watcher.close()
+
+    def _release_lidar(self):
+        """Stop the LIDAR and always disconnect it, so the serial port is free for the next start."""
+        if not self.lidar:
+            return
+        try:
+            try:
+                self.lidar.stop()
+            finally:
+                self.lidar.disconnect()
+        except Exception as e:
+            self.rhapi.ui.message_notify(f"LIDAR: Error disconnecting: {str(e)}")
+        self.lidar = None
+
+    def _hand_off(self, item):
+        """Queue an item for the hub-side consumer and wake it. Safe to call from the scan thread."""
+        self._scan_queue.append(item)
+        watcher = self._scan_watcher
+        if watcher:
+            watcher.send()
+
+    def _consume_scans(self):
+        """Publish revolutions handed over by the scan thread. Runs as a greenlet on the hub."""
+        while self.is_running:
+            self._scan_ready.wait()
+            self._scan_ready.clear()
+            while self._scan_queue:
+                item = self._scan_queue.popleft()
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    self._publish_scan(*item)
+                except Exception as e:
+                    self.rhapi.ui.message_alert(f'LIDAR scanning error: {str(e)}')
+                    # Don't let stop_lidar kill the greenlet it is running in
+                    self.scanning_greenlet = None
+                    self.stop_lidar()
+                    return
+
     def scan_loop(self):
         """
         Main LIDAR scanning loop with improved fast-object detection.
+        Runs on a native thread: anything touching the UI or the published scan is handed to the hub.
         """
+        previous_scheduling = self._set_scan_thread_scheduling()
         try:
-            # Initialize a detection buffer to help catch fast-moving objects
-            detection_buffer = []
-            max_buffer_size = 3  # Number of scans to consider for detection
+            # Detection history of recent scans to help catch fast-moving objects, one bit per scan
+            detection_bits = 0
+            detection_mask = (1 << 3) - 1  # Number of scans to consider for detection
             detection_angle_range = 90  # Increased from 10 to 20 degrees
             
             # Set scanner to motor speed to maximum if available
             if hasattr(self.lidar, 'set_motor_pwm'):
                 self.lidar.set_motor_pwm(1000)  # Maximum motor speed (if supported)
             
-            while self.is_running:
-                for scan in self.lidar.iter_scans(max_buf_meas=10000):  # Increased buffer for faster processing
-                    if not self.is_running:
-                        break
-                        
-                    # Process scan quickly before acquiring lock
+            # rplidar releases disagree on the spelling of the per-measurement iterator
+            iter_measures = getattr(self.lidar, 'iter_measures', None) or self.lidar.iter_measurments
+
+            # Bind hot-path lookups to locals once instead of resolving them per measurement
+            mono_ns = gevent.time.monotonic_ns
+            hand_off = self._hand_off
+            gate_low = detection_angle_range
+            gate_high = 360 - detection_angle_range
+            thr = self.detection_threshold
+            last_write = 0
+
+            # Measurements of the revolution currently being swept
+            scan_angles = []
+            scan_distances = []
+            append_angle = scan_angles.append
+            append_distance = scan_distances.append
+            has_detection = False
+
+            # Consume measurements as they arrive instead of waiting for a full revolution
+            for new_scan, quality, angle, distance in iter_measures(max_buf_meas=500):
+                if not self.is_running:
+                    # Stop the measurement stream from the thread that owns the read side
+                    self.lidar.stop()
+                    break
+
+                if new_scan and scan_angles:
+                    # Revolution boundary - hand the completed sweep over for visualization
+                    hand_off((scan_angles, scan_distances))
+                    scan_angles = []
+                    scan_distances = []
+                    append_angle = scan_angles.append
+                    append_distance = scan_distances.append
+                    # Pick up a threshold changed by calibration once per revolution
+                    thr = self.detection_threshold
+
+                    # Shift the completed scan's result into the history, dropping the oldest
+                    detection_bits = ((detection_bits << 1) | has_detection) & detection_mask
                     has_detection = False
-                    gate_detections = []
-                    
-                    # Convert scan data to simplified format for visualization and detection
-                    scan_data = []
-                    for _, angle, distance in scan:
-                        # Scale distance down to fit visualization (divide by 10 to convert mm to cm)
-                        distance_cm = distance / 10
-                        
-                        # Check for detections in the gate area (with wider angle range)
-                        if ((angle < detection_angle_range) or (angle > (360 - detection_angle_range))) and distance < self.detection_threshold:
-                            gate_detections.append({
-                                'angle': angle,
-                                'distance': distance
-                            })
-                            has_detection = True
-                        
-                        # Add to visualization data
-                        x = distance_cm * math.cos(math.radians(angle))
-                        y = distance_cm * math.sin(math.radians(angle))
-                        scan_data.append({
-                            'angle': angle,
-                            'distance': distance_cm,
-                            'x': x,
-                            'y': y
-                        })
-                    
-                    # Update detection buffer - add current scan result
-                    detection_buffer.append(has_detection)
-                    if len(detection_buffer) > max_buffer_size:
-                        detection_buffer.pop(0)  # Remove oldest detection
-                    
+
                     # Consider detection valid if any recent scans had a detection
-                    if any(detection_buffer):
-                        self.last_detection_time = self.rhapi.server.monotonic_to_epoch_millis(
-                            gevent.time.monotonic()
-                        )
-                    
-                    # Update visualization data with thread safety
-                    with self.scan_lock:
-                        self.last_scan_data = scan_data
-                    
-                    # Minimal sleep to allow other operations to proceed without slowing scan rate
-                                        
+                    if detection_bits:
+                        self.last_detection_time_ns = mono_ns()
+
+                # Skip invalid measurements (the LIDAR reports these with zero distance)
+                if distance == 0:
+                    continue
+
+                append_angle(angle)
+                append_distance(distance)
+
+                # Check for detections in the gate area and timestamp them immediately,
+                # at most once per DETECTION_DEBOUNCE_NS while a drone is passing through
+                if (angle < gate_low or angle > gate_high) and distance < thr:
+                    has_detection = True
+                    now = mono_ns()
+                    if now - last_write > DETECTION_DEBOUNCE_NS:
+                        last_write = now
+                        self.last_detection_time_ns = now
+                                    
         except Exception as e:
-            self.rhapi.ui.message_alert(f'LIDAR scanning error: {str(e)}')
-            self.stop_lidar()
+            # Errors raised while stopping are expected (the port is being closed)
+            if self.is_running:
+                self._hand_off(e)
+        finally:
+            # The thread goes back to gevent's pool, so don't leave it pinned or real-time
+            self._restore_scan_thread_scheduling(previous_scheduling)
+
+    def _set_scan_thread_scheduling(self):
+        """
+        Pin the calling (scan) thread to the last CPU and run it under SCHED_FIFO to cut serial
+        read jitter. Real-time priority needs CAP_SYS_NICE (e.g. `setcap cap_sys_nice+ep` on the
+        Python binary); without it, or off Linux, the thread keeps its normal scheduling.
+        Returns the previous settings for _restore_scan_thread_scheduling.
+        """
+        try:
+            previous = (os.sched_getaffinity(0), os.sched_getscheduler(0), os.sched_getparam(0))
+        except (AttributeError, OSError):
+            return None
+
+        try:
+            os.sched_setaffinity(0, {os.cpu_count() - 1})
+        except OSError:
+            pass
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(SCAN_THREAD_PRIORITY))
+        except OSError:  # PermissionError without CAP_SYS_NICE
+            pass
+        return previous
+
+    def _restore_scan_thread_scheduling(self, previous):
+        """Undo _set_scan_thread_scheduling on the calling thread."""
+        if previous is None:
+            return
+        affinity, policy, param = previous
+        try:
+            os.sched_setscheduler(0, policy, param)
+            os.sched_setaffinity(0, affinity)
+        except OSError:
+            pass
+
+    def _publish_scan(self, scan_angles, scan_distances):
+        """Project one completed revolution into the SoA frame and publish it."""
+        n = len(scan_angles)
+        frame = self._frame
+        if n > frame.shape[1]:
+            frame = self._frame = np.empty((4, n), dtype=np.float32)
+
+        # Write the revolution straight into the frame
+        angles, distances, xs, ys = frame[:, :n]
+        angles[:] = scan_angles
+        distances[:] = scan_distances
+
+        # Subscribers (calibration) get the sweep ordered by angle so the gate area is two contiguous
+        # slices. Nothing else needs the order, so the sort is skipped while nobody is subscribed.
+        # A revolution arrives as (nearly) ascending runs, which the stable sort handles in close to
+        # linear time.
+        if self._scan_subscribers:
+            order = np.argsort(angles, kind='stable')
+            angles[:] = angles[order]
+            distances[:] = distances[order]
+
+            for subscriber in self._scan_subscribers:
+                subscriber(angles, distances)
+
+        # Scale distance down to fit visualization (divide by 10 to convert mm to cm) and project to x/y
+        _project_scan(angles, distances, xs, ys)
+
+        # Serialize once here. The browser only plots x/y, so angle and distance stay server-side;
+        # the frame slice is row-major, so this is the two rows back to back.
+        payload = frame[2:, :n].tobytes()
+
+        # Publish with a single reference rebind - bytes are immutable, so no lock
+        self._scan_payload = payload
+
+        # Push the sweep to open visualizations, at most SCAN_PUSH_INTERVAL apart. The broadcast
+        # reaches every RotorHazard client, so skip it when no /lidar page has checked in lately.
+        now = gevent.time.monotonic()
+        if (now - self._last_push >= SCAN_PUSH_INTERVAL
+                and now - self._last_viz_keepalive < VIZ_KEEPALIVE_TIMEOUT):
+            self._last_push = now
+            self.rhapi.ui.socket_broadcast('lidar_scan', {
+                'scan': payload,
+                'threshold': self.detection_threshold
+            })
+
+    def _calibration_subscriber(self, angles, distances):
+        """Scan subscriber collecting gate-area distances (angles near 0/360 degrees) for calibrate."""
+        lo, hi = _gate_slices(angles, 10.0, 350.0)
+        self._collect_calibration(distances[:lo])
+        self._collect_calibration(distances[hi:])
+
+    def _collect_calibration(self, gate_distances):
+        """Copy gate distances into the calibration buffer, dropping whatever doesn't fit."""
+        start = self._calibration_count
+        count = min(gate_distances.size, self._calibration_buf.size - start)
+        self._calibration_buf[start:start + count] = gate_distances[:count]
+        self._calibration_count = start + count
 
     def open_visualization(self, args=None):
         """Open the LIDAR visualization."""
@@ -299,52 +581,48 @@ class LidarValidator:
         except Exception as e:
             self.rhapi.ui.message_notify(f'Error invalidating lap: {str(e)}')
 
+    def _validate_fast(self, now_ns):
+        """
+        Match a lap crossing at now_ns against the latest LIDAR detection.
+        Returns (ok, time difference in ns); the difference is None when nothing was detected yet.
+        """
+        detection_ns = self.last_detection_time_ns
+        if detection_ns is None:
+            return False, None
+        dt_ns = abs(now_ns - detection_ns)
+        return dt_ns <= self._window_ns, dt_ns
+
     def on_lap_recorded(self, args):
         """Handler for lap recording events with direct timestamp comparison."""
         # Skip validation if LIDAR is not running
         if not self.is_running:
-            self.rhapi.ui.message_notify("LIDAR not running - lap validation skipped")
+            # Every lap of every pilot lands here when the LIDAR is off - say so once in a while
+            now = gevent.time.monotonic()
+            if now - self._last_skip_notify > SKIP_NOTIFY_INTERVAL:
+                self._last_skip_notify = now
+                self.rhapi.ui.message_notify("LIDAR not running - lap validation skipped")
             return
 
+        # Take the time first (same monotonic clock the scan loop stamps detections with)
+        ok, time_diff_ns = self._validate_fast(gevent.time.monotonic_ns())
+
         # Get the lap data
         lap = args.get('lap')
         if not lap:
             return
-        
-        # Get the current time for reference
-        current_time = self.rhapi.server.monotonic_to_epoch_millis(gevent.time.monotonic())
-        
-        # Skip validation if we don't have a recent LIDAR detection
-        if not self.last_detection_time:
-            self.rhapi.ui.message_notify("No LIDAR detections - lap validation skipped")
-            # Also invalidate the lap since there was no LIDAR detection at all
+
+        # Log the time difference for debugging - only format it when someone asked to see it
+        if self._debug and time_diff_ns is not None:
+            self.rhapi.ui.message_notify(f'LIDAR validation: time diff = {time_diff_ns / 1e9:.3f}s (threshold: {self.detection_window:.2f}s)')
+
+        # One message per lap: the validation, or the invalidation notice from invalidate_lap
+        if ok:
+            self.rhapi.ui.message_notify('Lap validated by LIDAR detection ✓')
+        elif time_diff_ns is None:
             self.invalidate_lap(lap, args, "No LIDAR detection available")
-            return
-        
-        # Log raw values for debugging
-        self.rhapi.ui.message_notify(f"DEBUG: Current epoch ms time: {current_time}")
-        self.rhapi.ui.message_notify(f"DEBUG: LIDAR detection timestamp: {self.last_detection_time}")
-        
-        # Calculate the time difference between now and the last LIDAR detection
-        time_diff = abs(current_time - self.last_detection_time) / 1000.0  # Convert ms to seconds
-        
-        # Log the time difference for debugging
-        self.rhapi.ui.message_notify(f'LIDAR validation: time diff = {time_diff:.2f}s (threshold: {self.detection_window:.2f}s)')
-        
-        # Check if the time difference is within our validation window
-        if time_diff > self.detection_window:
-            # Invalid lap - no LIDAR detection within window
-            self.rhapi.ui.message_notify(
-                f'Warning: Invalid lap detected! No LIDAR detection within {self.detection_window}s window'
-            )
-            
-            # Use the shared invalidation function
-            self.invalidate_lap(lap, args, f"No LIDAR detection within {self.detection_window}s window")
         else:
-            # Valid lap - LIDAR detection confirms it
-            self.rhapi.ui.message_notify('Lap validated by LIDAR detection ✓')
-            
-    
+            self.invalidate_lap(lap, args, f"No LIDAR detection within {self.detection_window}s window")
+
     def on_race_stop(self, args):
         """Handler for race stop events."""
         self.rhapi.ui.message_notify("LIDAR: Race stopped, shutting down LIDAR")
@@ -362,14 +640,8 @@ class LidarValidator:
                 except Exception as e:
                     self.rhapi.ui.message_notify(f"LIDAR: Error stopping scan greenlet: {str(e)}")
                 self.scanning_greenlet = None
-                
-            if self.lidar:
-                try:
-                    self.lidar.stop()
-                    self.lidar.disconnect()
-                except Exception as e:
-                    self.rhapi.ui.message_notify(f"LIDAR: Error disconnecting: {str(e)}")
-                self.lidar = None
+            self._join_scan_thread()
+            self._release_lidar()
                 
             self.rhapi.ui.message_notify('LIDAR scanning stopped successfully')
             
@@ -423,31 +695,22 @@ class LidarValidator:
             self.rhapi.ui.message_alert('Calibration failed: Could not start LIDAR')
             return
         
-        # Create data collection variables
-        gate_distances = []
-        start_time = gevent.time.monotonic()
         calibration_duration = 10  # 10 seconds of data collection
         
         try:
-            # Collect data for 10 seconds
-            while gevent.time.monotonic() - start_time < calibration_duration:
-                # Short sleep to prevent CPU overloading
-                gevent.sleep(0.1)
-                
-                # Get latest scan data with lock protection
-                with self.scan_lock:
-                    # Only collect data in the "gate area" (angles near 0/360 degrees)
-                    for point in self.last_scan_data:
-                        angle = point['angle']
-                        # Consider points within the gate area (adjust range as needed)
-                        if angle < 10 or angle > 350:
-                            # Convert back to mm for threshold (data is stored in cm)
-                            gate_distances.append(point['distance'] * 10)
+            # Subscribe to the running scan pipeline - every revolution is collected exactly once
+            self._calibration_count = 0
+            self._scan_subscribers.append(self._calibration_subscriber)
+            deadline = gevent.time.monotonic() + calibration_duration
+            while gevent.time.monotonic() < deadline:
+                gevent.sleep(0.05)
+            self._scan_subscribers.remove(self._calibration_subscriber)
+            gate_distances = self._calibration_buf[:self._calibration_count]
             
             # Calculate the average if we have data
-            if gate_distances:
+            if gate_distances.size:
                 # Calculate average and add a margin (e.g., 80% of the average)
-                avg_distance = sum(gate_distances) / len(gate_distances)
+                avg_distance = float(gate_distances.mean())
                 # Set threshold to 80% of the average distance
                 calibrated_threshold = int(avg_distance * 0.8)
                 
@@ -456,13 +719,13 @@ class LidarValidator:
                 self.detection_threshold = calibrated_threshold
                 
                 # Update the option value in the database
-                self.rhapi.db.option_set('detection_distance', str(calibrated_threshold))
+                self._set_opt('detection_distance', str(calibrated_threshold))
                 
                             
                 # Notify user of successful calibration
                 self.rhapi.ui.message_notify(
                     f'Calibration complete: Detection threshold set to {calibrated_threshold}mm '
-                    f'(based on average of {len(gate_distances)} readings)'
+                    f'(based on average of {gate_distances.size} readings)'
                 )
             else:
                 self.rhapi.ui.message_alert('Calibration failed: No data collected in gate area')
@@ -471,10 +734,60 @@ class LidarValidator:
             self.rhapi.ui.message_alert(f'Calibration error: {str(e)}')
         
         finally:
+            if self._calibration_subscriber in self._scan_subscribers:
+                self._scan_subscribers.remove(self._calibration_subscriber)
+
             # Stop LIDAR if it wasn't running before
             if not was_already_running:
                 self.stop_lidar()
 
+def _build_blueprint(validator):
+    """Build the blueprint serving the LIDAR visualization page and its scan data endpoint."""
+    # Get the directory where this plugin file is located
+    plugin_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Create blueprint with absolute paths
+    bp = Blueprint(
+        'lidar_viz',
+        __name__,
+        template_folder=os.path.join(plugin_dir, 'templates'),
+        static_folder=os.path.join(plugin_dir, 'static'),
+        static_url_path='/static/lidar-viz' 
+    )
+
+    # The page has no Jinja markup, so load it once here and serve the same bytes every time
+    try:
+        with open(os.path.join(plugin_dir, 'templates', 'lidar_viz.html'), 'rb') as template_file:
+            viz_html = template_file.read()
+    except OSError as e:
+        viz_html = None
+        validator.rhapi.ui.message_alert(f'Error loading template: {str(e)}')
+    
+    @bp.route('/lidar')
+    def lidar_view():
+        """Serve the LIDAR visualization page."""
+        if viz_html is None:
+            return 'Error: LIDAR visualization template could not be loaded', 500
+        return Response(viz_html, mimetype='text/html',
+                        headers={'Cache-Control': 'public, max-age=3600'})
+        
+    @bp.route('/lidar/data')
+    def lidar_data():
+        """Serve the latest LIDAR scan as packed float32 x/y rows (see LidarValidator._scan_payload)."""
+        if not validator.is_running:
+            return jsonify({
+                'error': 'LIDAR not running',
+                'threshold': validator.detection_threshold or 1000
+            }), 503
+        
+        body = validator._scan_payload
+        return Response(body, mimetype='application/octet-stream', headers={
+            'X-Count': str(len(body) // 8),
+            'X-Threshold': str(validator.detection_threshold)
+        })
+
+    return bp
+
 def initialize(rhapi):
     """Initialize the plugin."""
     return LidarValidator(rhapi)
\ No newline at end of file
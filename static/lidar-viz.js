@@ -1,32 +1,70 @@
 // Destructure React hooks from React
 const { useState, useEffect, useRef } = React;
 
+// Split a packed scan (float32 rows: x, y in cm) into parallel views
+const decodeScan = (buffer) => {
+  const values = new Float32Array(buffer);
+  const n = values.length / 2;
+  return {
+    x: values.subarray(0, n),
+    y: values.subarray(n, 2 * n)
+  };
+};
+
+// Gate area is within 10 degrees of the 0 degree axis: |y| < x * tan(10 deg)
+const GATE_TAN = Math.tan(10 * Math.PI / 180);
+
+// How often an open page tells the server it still wants scans (server stops pushing after 5s)
+const KEEPALIVE_INTERVAL_MS = 2000;
+// Without a push for this long, ask /lidar/data whether the LIDAR is still running
+const STALE_PUSH_MS = 3 * KEEPALIVE_INTERVAL_MS;
+
 // LIDAR Visualization Component
 const LidarVisualization = () => {
-  const [scanData, setScanData] = useState([]);
+  const [scanData, setScanData] = useState({ x: [], y: [] });
   const [threshold, setThreshold] = useState(1000);
   const [error, setError] = useState(null);
 
   useEffect(() => {
+    let lastScanAt = Date.now();
+    const applyScan = (buffer, threshold) => {
+      lastScanAt = Date.now();
+      setError(null);
+      setScanData(decodeScan(buffer));
+      setThreshold(threshold);
+    };
+
+    // Fetch the current state once, then let the server push each new sweep (re-checked when pushes stop)
     const fetchData = async () => {
       try {
         const response = await fetch('/lidar/data');
-        const data = await response.json();
-        
-        if (data.error) {
+        if (!response.ok) {
+          const data = await response.json();
           setError(data.error);
-        } else {
-          setScanData(data.scan);
-          setThreshold(data.threshold);
+          return;
         }
+        applyScan(await response.arrayBuffer(), Number(response.headers.get('X-Threshold')));
       } catch (err) {
         setError('Failed to fetch LIDAR data: ' + err.message);
       }
     };
 
     fetchData();
-    const interval = setInterval(fetchData, 300); // Update every 100ms
-    return () => clearInterval(interval);
+    const socket = io();
+    socket.on('lidar_scan', (data) => applyScan(data.scan, data.threshold));
+    const keepAlive = () => {
+      socket.emit('lidar_viz_keepalive');
+      if (Date.now() - lastScanAt > STALE_PUSH_MS) {
+        lastScanAt = Date.now();
+        fetchData();
+      }
+    };
+    socket.on('connect', keepAlive);
+    const keepAliveTimer = setInterval(keepAlive, KEEPALIVE_INTERVAL_MS);
+    return () => {
+      clearInterval(keepAliveTimer);
+      socket.disconnect();
+    };
   }, []);
 
   const canvasRef = useRef(null);
@@ -63,21 +101,24 @@ const LidarVisualization = () => {
     ctx.arc(centerX, centerY, threshold / 10 * scale, Math.PI - Math.PI/18, Math.PI + Math.PI/18);
     ctx.stroke();
 
-    // Draw scan points
-    scanData.forEach(point => {
-      const isInGateArea = (point.angle < 10 || point.angle > 350) && point.distance * 10 < threshold;
+    // Draw scan points (scan data arrives as parallel x/y arrays in cm)
+    const { x, y } = scanData;
+    const thresholdCm = threshold / 10;
+    for (let i = 0; i < x.length; i++) {
+      const isInGateArea = Math.abs(y[i]) < x[i] * GATE_TAN &&
+        x[i] * x[i] + y[i] * y[i] < thresholdCm * thresholdCm;
       
       ctx.fillStyle = isInGateArea ? '#dc3545' : '#0d6efd';
       ctx.beginPath();
       ctx.arc(
-        centerX + point.x * scale,
-        centerY - point.y * scale,
+        centerX + x[i] * scale,
+        centerY - y[i] * scale,
         2,
         0,
         2 * Math.PI
       );
       ctx.fill();
-    });
+    }
 
     // Draw legend
     ctx.font = '12px Arial';